@@ -1,12 +1,23 @@
+import logging
+import logging.handlers
+import math
+import sys
 import threading
 import time
 import random
 import queue
-from datetime import datetime
 
 # Número de processos na simulação
 NUM_PROCESSOS = 6
 
+# Quantos processos recebem a retransmissão (gossip) de uma mensagem recém-entregue
+GOSSIP_FANOUT = max(1, math.ceil(math.log2(NUM_PROCESSOS)))
+
+# Mensagem especial usada para parar a thread
+STOP_MESSAGE = object()
+
+logger = logging.getLogger(__name__)
+
 class Processo(threading.Thread):
     """
     Representa um processo no sistema distribuído.
@@ -17,52 +28,87 @@ class Processo(threading.Thread):
         self.id = process_id
         self.all_queues = all_queues
         self.message_queue = self.all_queues[self.id]
+
+        # Destinos pré-calculados: todos os processos exceto este
+        self._peer_ids = tuple(i for i in range(len(all_queues)) if i != self.id)
+        self._peer_queues = tuple(all_queues[i] for i in self._peer_ids)
         
         # Estruturas de dados do processo
         self.lamport_clock = 0
-        self.delivered_messages = set() # Para garantir a entrega única (evita loops de gossip)
-        self.lock = threading.Lock() # Para acesso seguro ao relógio e ao conjunto de mensagens
+        self.sequence_number = 0 # Número de sequência das mensagens enviadas por este processo
+        # Para garantir a entrega única (evita loops de gossip), guardamos por remetente o
+        # maior número de sequência entregue de forma contígua e as entregas fora de ordem
+        # acima dele. A memória fica limitada à janela fora de ordem, não ao total de mensagens.
+        self._delivered_high_water = [0] * len(all_queues)
+        self._delivered_ahead = [set() for _ in all_queues]
+        self.lock = threading.Lock() # Para acesso seguro ao relógio e às mensagens entregues
         self.running = True
 
     def _tick(self):
         """Incrementa o relógio de Lamport (evento interno)."""
         self.lamport_clock += 1
 
-    def handle_receive(self, received_message: dict):
+    def _already_delivered(self, sender: int, sequence: int) -> bool:
+        """Indica se a mensagem (remetente, sequência) já foi entregue."""
+        return sequence <= self._delivered_high_water[sender] or sequence in self._delivered_ahead[sender]
+
+    def _mark_delivered(self, sender: int, sequence: int):
+        """
+        Registra a entrega de (remetente, sequência) e avança o limite contíguo do
+        remetente, descartando as entregas fora de ordem que passam a ser cobertas por ele.
+        """
+        ahead = self._delivered_ahead[sender]
+        ahead.add(sequence)
+        high_water = self._delivered_high_water[sender]
+        while high_water + 1 in ahead:
+            high_water += 1
+            ahead.remove(high_water)
+        self._delivered_high_water[sender] = high_water
+
+    def handle_receive(self, received_message: tuple):
         """
         Processa uma mensagem recebida. Implementa a Regra 3 de Lamport e o
         protocolo de multicast confiável (gossip).
+
+        As mensagens têm formato fixo:
+        (remetente_original, número_de_sequência, timestamp, conteúdo).
         """
-        original_sender = received_message['original_sender']
-        timestamp = received_message['timestamp']
-        content = received_message['content']
-        
-        # Uma mensagem é única pela combinação de seu remetente original e seu timestamp
-        message_unique_id = (original_sender, timestamp)
+        original_sender, sequence, timestamp, content = received_message
+
+        # Uma mensagem é única pela combinação de seu remetente original e seu número de sequência.
+        # Rejeição rápida de duplicatas, sem precisar adquirir o lock
+        if self._already_delivered(original_sender, sequence):
+            return
 
         with self.lock:
             # Se já entregamos esta mensagem, ignoramos para evitar loops
-            if message_unique_id in self.delivered_messages:
+            if self._already_delivered(original_sender, sequence):
                 return
 
             # Atualiza o relógio de Lamport (Regra 3)
             self.lamport_clock = max(self.lamport_clock, timestamp) + 1
-            
-            # Marca a mensagem como entregue
-            self.delivered_messages.add(message_unique_id)
-
-            # Exibe a entrega da mensagem de forma clara
-            print(
-                f"[{datetime.now().strftime('%H:%M:%S.%f')[:-3]}] "
-                f"Processo {self.id}: MENSAGEM ENTREGUE! "
-                f"Conteúdo: '{content}' | "
-                f"Remetente Original: {original_sender} | "
-                f"Timestamp da Mensagem: {timestamp} | "
-                f"Meu Relógio Agora: {self.lamport_clock}", flush=True
-            )
+            clock_after_delivery = self.lamport_clock
 
-        # Retransmite a mensagem para todos os outros para garantir a confiabilidade (Gossip)
-        self._basic_multicast(received_message)
+            # Marca a mensagem como entregue
+            self._mark_delivered(original_sender, sequence)
+
+        # Registra a entrega da mensagem de forma clara (fora do lock). O texto só é
+        # montado se o nível estiver habilitado; o horário é formatado pela thread de log.
+        logger.info(
+            "Processo %d: MENSAGEM ENTREGUE! "
+            "Conteúdo: '%s' | "
+            "Remetente Original: %d | "
+            "Timestamp da Mensagem: %d | "
+            "Meu Relógio Agora: %d",
+            self.id, content, original_sender, timestamp, clock_after_delivery
+        )
+
+        # Mensagens próprias já foram enviadas a todos em multicast(), não há o que retransmitir
+        if original_sender == self.id:
+            return
+
+        # Retransmite a mensagem para alguns outros para garantir a confiabilidade (Gossip)
+        self._gossip(received_message)
 
     def multicast(self, message_content: str):
         """
@@ -71,29 +117,35 @@ class Processo(threading.Thread):
         with self.lock:
             # Incrementa o relógio para o evento de envio (Regra 1 de Lamport)
             self._tick()
-            
-            print(
-                f"[{datetime.now().strftime('%H:%M:%S.%f')[:-3]}] "
-                f"Processo {self.id}: ENVIANDO MULTICAST... "
-                f"Conteúdo: '{message_content}' | "
-                f"Meu Relógio: {self.lamport_clock}", flush=True
-            )
-            
-            message = {
-                'content': message_content,
-                'timestamp': self.lamport_clock,
-                'original_sender': self.id
-            }
-
-        # Envia a mensagem para todos os processos (incluindo ele mesmo, por simplicidade,
-        # embora pudesse ser otimizado para não enviar a si mesmo)
+            self.sequence_number += 1
+            message = (self.id, self.sequence_number, self.lamport_clock, message_content)
+
+        logger.info(
+            "Processo %d: ENVIANDO MULTICAST... "
+            "Conteúdo: '%s' | "
+            "Meu Relógio: %d",
+            self.id, message_content, message[2]
+        )
+
+        # Envia a mensagem para todos os outros processos e a entrega localmente,
+        # sem passar pela própria fila
         self._basic_multicast(message)
+        self.handle_receive(message)
 
-    def _basic_multicast(self, message: dict):
+    def _basic_multicast(self, message: tuple):
         """
-        Função auxiliar que envia a mensagem para as filas de todos os processos.
+        Função auxiliar que envia a mensagem para as filas de todos os outros processos.
         """
-        for i in range(len(self.all_queues)):
+        for peer_queue in self._peer_queues:
+            peer_queue.put(message)
+
+    def _gossip(self, message: tuple):
+        """
+        Retransmite uma mensagem recém-entregue para um subconjunto aleatório de
+        GOSSIP_FANOUT processos, excluindo este processo e o remetente original.
+        """
+        candidates = [i for i in self._peer_ids if i != message[0]]
+        for i in random.sample(candidates, min(GOSSIP_FANOUT, len(candidates))):
             self.all_queues[i].put(message)
 
     def run(self):
@@ -101,32 +153,41 @@ class Processo(threading.Thread):
         Loop principal do processo. Fica escutando por mensagens em sua fila.
         """
         while self.running:
-            try:
-                # Espera por uma mensagem na fila, com um timeout para poder parar a thread
-                message = self.message_queue.get(timeout=0.1)
-                
-                # Mensagem especial para parar a thread
-                if message.get('type') == 'STOP':
-                    self.running = False
-                    continue
-
-                self.handle_receive(message)
-
-            except queue.Empty:
-                # Nenhuma mensagem na fila, continua o loop
+            # Bloqueia até chegar uma mensagem; a thread é acordada pela STOP_MESSAGE,
+            # então não é preciso acordar periodicamente com um timeout
+            message = self.message_queue.get()
+
+            # Mensagem especial para parar a thread
+            if message is STOP_MESSAGE:
+                self.running = False
                 continue
 
+            self.handle_receive(message)
+
     def stop(self):
         """Sinaliza para a thread parar."""
-        self.all_queues[self.id].put({'type': 'STOP'})
+        self.all_queues[self.id].put(STOP_MESSAGE)
 
 
 if __name__ == "__main__":
-    print("--- Iniciando Simulação de Multicast Confiável com Relógios de Lamport ---")
-    print(f"--- Simulação com {NUM_PROCESSOS} processos ativos ---")
+    # As threads dos processos montam o texto das mensagens de log e as enfileiram; uma
+    # única thread (QueueListener) acrescenta o horário e escreve no terminal
+    fila_de_log = queue.SimpleQueue()
+    saida_do_log = logging.StreamHandler(sys.stdout)
+    saida_do_log.setFormatter(logging.Formatter("[%(asctime)s.%(msecs)03d] %(message)s", "%H:%M:%S"))
+    listener = logging.handlers.QueueListener(fila_de_log, saida_do_log)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        handlers=[logging.handlers.QueueHandler(fila_de_log)],
+    )
+    listener.start()
+
+    logger.info("--- Iniciando Simulação de Multicast Confiável com Relógios de Lamport ---")
+    logger.info("--- Simulação com %d processos ativos ---", NUM_PROCESSOS)
 
     # Cria uma fila para cada processo
-    filas_de_mensagens = [queue.Queue() for _ in range(NUM_PROCESSOS)]
+    filas_de_mensagens = [queue.SimpleQueue() for _ in range(NUM_PROCESSOS)]
 
     # Cria e inicia os processos
     processos = [Processo(i, filas_de_mensagens) for i in range(NUM_PROCESSOS)]
@@ -140,7 +201,7 @@ if __name__ == "__main__":
     # --- Simulação de Eventos ---
     # Processos diferentes enviam mensagens em momentos diferentes.
     
-    print("\n--- Disparando Eventos de Multicast ---\n")
+    logger.info("--- Disparando Eventos de Multicast ---")
     
     # Evento 1: Processo 2 envia uma mensagem
     time.sleep(random.uniform(0, 1))
@@ -155,15 +216,16 @@ if __name__ == "__main__":
     processos[0].multicast("Esta mensagem deve ter um timestamp maior")
 
     # Espera um tempo suficiente para que todas as mensagens se propaguem e sejam entregues
-    print("\n--- Aguardando propagação das mensagens (10 segundos) ---\n")
+    logger.info("--- Aguardando propagação das mensagens (10 segundos) ---")
     time.sleep(10)
 
     # Para todas as threads
-    print("--- Encerrando a simulação e parando os processos... ---")
+    logger.info("--- Encerrando a simulação e parando os processos... ---")
     for p in processos:
         p.stop()
     
     for p in processos:
         p.join() # Espera a thread realmente terminar
 
-    print("--- Simulação Concluída ---")
+    logger.info("--- Simulação Concluída ---")
+    listener.stop()